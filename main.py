@@ -1,20 +1,128 @@
 import os
-import json
+import re
 import time
-import uuid
-from typing import Union, List, Dict, Any
+import threading
+import concurrent.futures
+from typing import Union, Dict, Any
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+import anyio.to_thread
+import msgspec
+import orjson
+import zstandard as zstd
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
 
-app = FastAPI(title="SecurePaste Hybrid")
+# orjson 直接输出 UTF-8 bytes，序列化/反序列化比 stdlib json 快数倍
+app = FastAPI(title="SecurePaste Hybrid", default_response_class=ORJSONResponse)
 
 # 配置
 DATA_DIR = Path("data/pastes")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# 列表缓存：key 为索引文件的 (st_mtime_ns, st_size)，每次追加都会改变两者，
+# 自动失效；写入路径还会显式重置 key
+_LIST_CACHE = {"key": None, "payload": None}
+_LIST_LOCK = threading.Lock()
+
+
+def _invalidate_list_cache():
+    with _LIST_LOCK:
+        _LIST_CACHE["key"] = None
+
+
+# 冷缓存重建时并发读文件：read() 和 orjson 解析都释放 GIL，IO 等待可叠加
+_IO_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+
+
+# 落盘前 zstd 压缩（level 3）：文本/base64 通常可压 2-4 倍，读写的 IO
+# 带宽随之减半；zstd 解压吞吐远高于磁盘，CPU 代价可忽略。
+# 旧的未压缩 .json 文件靠帧头 magic 识别，原样兼容
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _load_one(path):
+    """读取并解析单个 paste 文件（压缩或明文），损坏/读取失败返回 None"""
+    try:
+        raw = Path(path).read_bytes()
+        if raw[:4] == _ZSTD_MAGIC:
+            raw = zstd.decompress(raw)
+        return orjson.loads(raw)
+    except Exception:
+        return None
+
+
+def _scan_legacy_names():
+    """启动时一次 scandir 建立旧命名 id -> 文件名映射。
+
+    旧数据叫 {ts}_{uuid4}.json，按 id 找文件原来要 glob 整个目录（O(N)
+    dirent 扫描），查表后变成 O(1)；新命名 {uuid7}.json 直接按 id 定位。
+    """
+    names = {}
+    with os.scandir(DATA_DIR) as it:
+        for e in it:
+            if e.name.endswith(".json") and "_" in e.name:
+                names[e.name[:-5].split("_", 1)[1]] = e.name
+    return names
+
+
+_LEGACY_NAMES = _scan_legacy_names()
+
+# 合法 ID 就是 32 位 hex：一次预编译正则匹配替代多次子串扫描，
+# 顺带挡掉 ".."/"/" 检查覆盖不到的畸形输入（null 字节、大写绕过等）
+_HEX32 = re.compile(r"[0-9a-f]{32}\Z").match
+
+
+def _uuid7_hex():
+    """手搓 UUIDv7 (RFC 9562)：前 48 bit 是毫秒时间戳，hex 字典序即创建顺序。
+
+    文件名直接用它就天然按时间排序，不再需要 {ts}_ 前缀。
+    """
+    ts_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")  # 80 bit 随机
+    val = (ts_ms & ((1 << 48) - 1)) << 80
+    val |= 0x7 << 76                          # version 7
+    val |= ((rand >> 68) & 0xFFF) << 64       # rand_a
+    val |= 0x2 << 62                          # variant 10
+    val |= rand & ((1 << 62) - 1)             # rand_b
+    return f"{val:032x}"
+
+
+# 侧车索引：每行一条 {id, timestamp, is_encrypted, remark}，列表页只读索引，
+# 不再为 200 条记录读取完整 content（加密大段文本是最大的 IO 开销）
+INDEX_PATH = DATA_DIR.with_name(DATA_DIR.name + ".ndjson")
+
+
+def _index_append(record):
+    with open(INDEX_PATH, "ab") as f:
+        f.write(orjson.dumps(record) + b"\n")
+
+
+def _rebuild_index():
+    """索引缺失时从存量 paste 文件重建（兼容旧数据）"""
+    with os.scandir(DATA_DIR) as it:
+        entries = [e for e in it if e.name.endswith((".json", ".json.zst"))]
+
+    # 新旧命名混存时文件名不可比，按记录里的 timestamp 排序（旧到新）
+    records = [d for d in _IO_POOL.map(_load_one, [e.path for e in entries])
+               if d is not None]
+    records.sort(key=lambda d: d.get("timestamp", 0))
+
+    lines = []
+    for data in records:
+        lines.append(orjson.dumps({
+            "id": data.get("id", ""),
+            "timestamp": data.get("timestamp", 0),
+            "is_encrypted": data.get("is_encrypted", False),
+            "remark": data.get("remark", ""),
+        }) + b"\n")
+    INDEX_PATH.write_bytes(b"".join(lines))
+
+
+if not INDEX_PATH.exists():
+    _rebuild_index()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,77 +131,156 @@ app.add_middleware(
 )
 
 
-# --- Pydantic Models ---
+# Linux 独有；不支持的平台/文件系统走临时名 + replace 回退
+_O_TMPFILE = getattr(os, "O_TMPFILE", 0)
 
-class EncryptedPayload(BaseModel):
-    ct: str
-    iv: str
-    ek: str
 
+def _atomic_write_bytes(dir_path, name, payload):
+    """先写后挂名的原子落盘：崩溃也不会在目录里留下半截文件。
 
-class PasteCreate(BaseModel):
-    content: Union[str, EncryptedPayload, Dict[str, Any]]
-    is_encrypted: bool
-    remark: str = ""  # 新增：备注字段，默认为空
+    Linux 上用 O_TMPFILE + link——匿名文件写完后才通过 /proc/self/fd
+    挂到最终名字，中间状态对 scandir/索引重建完全不可见；
+    其他平台回退到临时名 + os.replace。
+    """
+    if _O_TMPFILE:
+        fd = -1
+        try:
+            fd = os.open(dir_path, _O_TMPFILE | os.O_WRONLY, 0o644)
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+            os.link(f"/proc/self/fd/{fd}", os.path.join(dir_path, name))
+            return
+        except OSError:
+            # 文件系统不支持 O_TMPFILE 或 /proc link（如 overlayfs 报
+            # EXDEV），走下面的临时名回退
+            pass
+        finally:
+            if fd >= 0:
+                os.close(fd)
+
+    tmp_path = os.path.join(dir_path, f".{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, os.path.join(dir_path, name))
 
 
-class PasteResponse(BaseModel):
-    id: str
-    timestamp: int
+# --- Models ---
+# msgspec.Struct：C 层字段校验，比 Pydantic 模型快一个数量级；
+# 加密 payload ({ct, iv, ek}) 归入 dict 分支（msgspec 的 union 不允许
+# Struct 和 dict 并存），持久化行为不变
+
+class PasteCreate(msgspec.Struct):
+    content: Union[str, Dict[str, Any]]
     is_encrypted: bool
-    remark: str = ""  # 新增
-    content: Union[str, EncryptedPayload, Dict[str, Any]]
+    remark: str = ""  # 备注字段，默认为空
 
 
 # --- API Endpoints ---
 
 @app.post("/api/paste")
-async def create_paste(paste: PasteCreate):
-    paste_id = uuid.uuid4().hex
-    timestamp = int(time.time())
+async def create_paste(request: Request):
+    # 绕开 FastAPI 的 Pydantic 解析层：直接取原始 body 交给 msgspec
+    try:
+        paste = msgspec.json.decode(await request.body(), type=PasteCreate)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    filename = f"{timestamp}_{paste_id}.json"
-    file_path = DATA_DIR / filename
+    paste_id = _uuid7_hex()
+    timestamp = int(time.time())
+    filename = f"{paste_id}.json.zst"
 
     data = {
         "id": paste_id,
         "timestamp": timestamp,
         "is_encrypted": paste.is_encrypted,
         "remark": paste.remark[:50],  # 简单截断，防止备注过长
-        "content": paste.content if isinstance(paste.content, dict) else paste.content
+        "content": paste.content,
     }
 
-    if hasattr(paste.content, "dict"):
-        data["content"] = paste.content.dict()
+    def _persist():
+        _atomic_write_bytes(str(DATA_DIR), filename,
+                            zstd.compress(orjson.dumps(data), 3))
+        _index_append({
+            "id": paste_id,
+            "timestamp": timestamp,
+            "is_encrypted": paste.is_encrypted,
+            "remark": data["remark"],
+        })
 
+    # 路由改回 async 后阻塞写盘丢进线程池，不卡事件循环
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        await anyio.to_thread.run_sync(_persist)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    _invalidate_list_cache()
     return {"status": "success", "id": paste_id}
 
 
-@app.get("/api/pastes", response_model=List[PasteResponse])
-async def list_pastes():
-    pastes = []
-    files = sorted(DATA_DIR.glob("*.json"), reverse=True)
+# 列表/单条都是我们自己写盘的数据，读回时不做 Pydantic 校验：
+# response_model 会把 200 条记录逐条重新验证，纯开销
+@app.get("/api/pastes")
+def list_pastes():
+    try:
+        st = os.stat(INDEX_PATH)
+        cache_key = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        cache_key = (0, 0)
 
-    for f in files[:200]:
-        try:
-            with open(f, "r", encoding="utf-8") as file:
-                data = json.load(file)
-                # 兼容旧数据（如果旧json没有remark字段）
-                if "remark" not in data:
-                    data["remark"] = ""
-                pastes.append(data)
-        except Exception:
-            continue
+    with _LIST_LOCK:
+        if _LIST_CACHE["key"] == cache_key:
+            return Response(_LIST_CACHE["payload"], media_type="application/json")
+
+    # 单次顺序读索引尾部，代替 200 次随机读完整 paste 文件；
+    # 索引行本身就是 JSON，直接拼接成响应，零反序列化/再序列化
+    try:
+        with open(INDEX_PATH, "rb") as f:
+            lines = f.readlines()[-200:]
+    except FileNotFoundError:
+        lines = []
+
+    # 断电/磁盘满可能让追加写只落下半行；完整的索引行必然是 {...}\n，
+    # 发现撕裂行就从存量文件重建索引自愈，避免永远吐出坏 JSON
+    if any(not (ln.startswith(b"{") and ln.rstrip().endswith(b"}")) for ln in lines):
+        _rebuild_index()
+        st = os.stat(INDEX_PATH)
+        cache_key = (st.st_mtime_ns, st.st_size)
+        with open(INDEX_PATH, "rb") as f:
+            lines = f.readlines()[-200:]
+
+    payload = b"[" + b",".join(ln.rstrip() for ln in reversed(lines)) + b"]"
+
+    with _LIST_LOCK:
+        _LIST_CACHE["key"] = cache_key
+        _LIST_CACHE["payload"] = payload
+
+    return Response(payload, media_type="application/json")
+
+
+@app.get("/api/paste/{paste_id}")
+def get_paste(paste_id: str):
+    """列表只含元数据，点击条目时按需拉取完整内容"""
+    if not _HEX32(paste_id):
+        raise HTTPException(status_code=400, detail="bad id")
 
-    return pastes
+    # 直接尝试读取代替先 exists() 再 open（少一半 stat）：
+    # 新命名 {uuid7}.json.zst 直接定位，旧命名查启动时建好的映射，不 glob
+    data = _load_one(DATA_DIR / f"{paste_id}.json.zst")
+    if data is None:
+        data = _load_one(DATA_DIR / f"{paste_id}.json")
+    if data is None:
+        legacy_name = _LEGACY_NAMES.get(paste_id)
+        if legacy_name is not None:
+            data = _load_one(DATA_DIR / legacy_name)
+    if data is None:
+        raise HTTPException(status_code=404, detail="not found")
+    if "remark" not in data:
+        data["remark"] = ""
+    return data
 
 
+# 生产环境由 nginx 直出静态文件（见 deploy/nginx.conf），此挂载仅作开发兜底
 app.mount("/", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static"), html=True), name="static")
 
 if __name__ == "__main__":
@@ -1,31 +1,163 @@
 import os
-import json
+import re
+import mmap
 import time
 import uuid
 import shutil
+import sqlite3
+import threading
+import concurrent.futures
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory, abort
+import orjson
+import zstandard as zstd
+from flask import Flask, Response, request, jsonify, send_from_directory, abort
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
 
 app = Flask(__name__, static_folder='static')
 app.config['JSON_AS_ASCII'] = False
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 裸分片上限
 
 CORS(app)
 
 # 目录配置
-DATA_DIR = Path("data/store")  # 改名：pastes -> store
+DATA_DIR = Path("data/store")  # 旧 one-file-per-paste 存储，仅用于迁移
 CACHE_DIR = Path("data/io_cache")  # 改名：temp_uploads -> io_cache
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# 热路径用预先算好的 str 路径 + os.path.join，省去每请求的 PurePath 对象分配
+CACHE_DIR_STR = str(CACHE_DIR)
+
+# 会话目录的延迟回收：rmtree 对每个分片发一次 unlink，分片多时拖慢 commit；
+# 改成 O(1) rename 挪进回收目录，由后台线程批量删除
+TRASH_DIR = Path("data/trash")
+TRASH_DIR.mkdir(parents=True, exist_ok=True)
+TRASH_DIR_STR = str(TRASH_DIR)
+
+# SQLite (WAL) 存储：列表从最多 200 次 open/read/close 变成一次
+# 按 ts 索引的顺序 SELECT，删除从 O(glob) 变成主键 DELETE
+DB_PATH = Path("data/store.db")
+
+# 合法 ID（sess_id / 条目 id）就是 32 位 hex：一次预编译正则匹配替代
+# 多次子串扫描，顺带挡掉 ".."/"/" 检查覆盖不到的畸形输入
+_HEX32 = re.compile(r"[0-9a-f]{32}\Z").match
+
+# body 列落库前 zstd 压缩（level 3）：密文/文本通常可压 2-4 倍，读写 IO
+# 带宽随之减半；解压吞吐远高于磁盘。旧的未压缩行靠帧头 magic 识别
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# 迁移时并发读文件：read() 和 orjson 解析都释放 GIL，IO 等待可叠加
+_IO_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+
+
+def _load_one(path):
+    """读取并解析单个数据文件，损坏/读取失败返回 None"""
+    try:
+        return orjson.loads(Path(path).read_bytes())
+    except Exception:
+        return None
+
+
+def _uuid7_hex():
+    """手搓 UUIDv7 (RFC 9562)：前 48 bit 是毫秒时间戳，hex 字典序即创建顺序。
+
+    作为主键时按时间自然聚簇，新行总是追加到 B-tree 末尾。
+    """
+    ts_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")  # 80 bit 随机
+    val = (ts_ms & ((1 << 48) - 1)) << 80
+    val |= 0x7 << 76                          # version 7
+    val |= ((rand >> 68) & 0xFFF) << 64       # rand_a
+    val |= 0x2 << 62                          # variant 10
+    val |= rand & ((1 << 62) - 1)             # rand_b
+    return f"{val:032x}"
+
+
+# Flask 多线程处理请求，sqlite3 连接不能跨线程共用，按线程各持一个
+_DB_LOCAL = threading.local()
+
+
+def _db():
+    conn = getattr(_DB_LOCAL, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _DB_LOCAL.conn = conn
+    return conn
+
+
+def _migrate_legacy_files():
+    """把存量 one-file-per-paste 数据一次性导入 SQLite，导入后删除源文件"""
+    with os.scandir(DATA_DIR) as it:
+        entries = [e for e in it if e.name.endswith(".json")]
+    if not entries:
+        return
+
+    entries.sort(key=lambda e: e.name)  # 旧到新，保持 rowid 即写入顺序
+    conn = _db()
+    migrated = []
+    for entry, data in zip(entries, _IO_POOL.map(_load_one, [e.path for e in entries])):
+        # 解析失败/缺 srv_id 的文件原地保留（旧列表逻辑也只是跳过，不动文件）
+        if data is None or not data.get("srv_id"):
+            continue
+        conn.execute(
+            "INSERT OR IGNORE INTO pastes(id, ts, mode, note, body) VALUES(?,?,?,?,?)",
+            (data["srv_id"], data.get("ts", 0), data.get("mode", 0),
+             data.get("note", ""), zstd.compress(orjson.dumps(data), 3)),
+        )
+        migrated.append(entry.path)
+    conn.commit()
+
+    # 只删真正入库的文件；多 worker 并发启动时对方可能已抢先删掉，缺失忽略
+    for path in migrated:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    # 旧的侧车索引随文件存储一并退役
+    DATA_DIR.with_name(DATA_DIR.name + ".ndjson").unlink(missing_ok=True)
+
+
+def _init_db():
+    conn = _db()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pastes("
+        "id TEXT PRIMARY KEY, ts INTEGER, mode INTEGER, note TEXT, body BLOB)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ts_idx ON pastes(ts DESC)")
+    conn.commit()
+    _migrate_legacy_files()
+
+
+_init_db()
+
 
 # --- 辅助函数 ---
 
 def clean_cache(sess_id):
-    """清理临时会话文件夹"""
-    target_dir = CACHE_DIR / sess_id
-    if target_dir.exists():
-        shutil.rmtree(target_dir, ignore_errors=True)
+    """清理临时会话文件夹：一次原子 rename，真正的删除交给后台线程"""
+    try:
+        os.rename(os.path.join(CACHE_DIR_STR, sess_id),
+                  os.path.join(TRASH_DIR_STR, uuid.uuid4().hex))
+    except OSError:
+        pass  # 目录不存在（会话已清理）等情况直接忽略
+
+
+def _sweep_trash():
+    """每 60s 批量 rmtree 回收目录里的内容，不占请求关键路径"""
+    while True:
+        time.sleep(60)
+        try:
+            with os.scandir(TRASH_DIR_STR) as it:
+                for e in it:
+                    shutil.rmtree(e.path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+threading.Thread(target=_sweep_trash, name="trash-sweeper", daemon=True).start()
 
 
 # --- 数据传输相关 API (原 Upload) ---
@@ -36,8 +168,7 @@ def io_handshake():
     """原 upload/init：建立传输会话"""
     sess_id = uuid.uuid4().hex
     # 创建临时目录
-    work_dir = CACHE_DIR / sess_id
-    work_dir.mkdir(parents=True, exist_ok=True)
+    os.makedirs(os.path.join(CACHE_DIR_STR, sess_id), exist_ok=True)
 
     # 返回 sess_id 而非 upload_id
     return jsonify({"ret": 0, "sess_id": sess_id})
@@ -45,33 +176,45 @@ def io_handshake():
 
 @app.route("/api/io/push_shard", methods=["POST"])
 def io_push_shard():
-    """原 upload/chunk：接收分片"""
-    req = request.get_json()
-    if not req:
-        return jsonify({"err": "nodata"}), 400
+    """原 upload/chunk：接收分片
 
-    # 参数混淆
-    sess_id = req.get("sess_id")
-    seq_no = req.get("seq")  # 原 index
-    blob = req.get("blob")  # 原 data
+    分片走裸二进制 body + header 传参：省去逐分片的 JSON 解析和
+    JSON 转义/重编码，bytes 原样落盘。
+    """
+    sess_id = request.headers.get("X-Sess-Id")
+    seq_no = request.headers.get("X-Seq")
 
-    if not sess_id or seq_no is None or blob is None:
+    if not sess_id or seq_no is None:
         return jsonify({"err": "bad_args"}), 422
 
-    if ".." in sess_id or "/" in sess_id:
+    try:
+        seq_no = int(seq_no)
+    except ValueError:
+        return jsonify({"err": "bad_args"}), 422
+
+    if not _HEX32(sess_id):
         return jsonify({"err": "bad_id"}), 400
 
-    save_dir = CACHE_DIR / sess_id
-    if not save_dir.exists():
+    blob = request.get_data(cache=False, as_text=False)
+    if not blob:
+        return jsonify({"err": "nodata"}), 400
+
+    # 直接 open：会话目录不存在时 FileNotFoundError 即"会话过期"，
+    # 省掉先 exists() 再 open 的那次 stat
+    chunk_path = os.path.join(CACHE_DIR_STR, sess_id, str(seq_no))
+    try:
+        fd = os.open(chunk_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    except FileNotFoundError:
         return jsonify({"err": "timeout"}), 404
 
     try:
-        # 保存分片
-        chunk_path = save_dir / str(seq_no)
-        with open(chunk_path, "w", encoding="utf-8") as f:
-            f.write(blob)
+        view = memoryview(blob)
+        while view:
+            view = view[os.write(fd, view):]
     except Exception as e:
         return jsonify({"err": "io_err"}), 500
+    finally:
+        os.close(fd)
 
     return jsonify({"ret": 0})
 
@@ -86,42 +229,57 @@ def io_commit():
     if not sess_id or count is None:
         return jsonify({"err": "bad_args"}), 422
 
-    chunk_dir = CACHE_DIR / sess_id
-    if not chunk_dir.exists():
-        return jsonify({"err": "missing"}), 404
+    if not _HEX32(sess_id):
+        return jsonify({"err": "bad_id"}), 400
 
-    # 1. 验证完整性
-    for i in range(count):
-        if not (chunk_dir / str(i)).exists():
-            clean_cache(sess_id)
-            return jsonify({"err": f"missing_seq_{i}"}), 400
+    chunk_dir = os.path.join(CACHE_DIR_STR, sess_id)
+    merged_path = os.path.join(chunk_dir, "merged")
+
+    # 合并兼校验：流式拷进会话目录下的 merged 文件（1 MiB 缓冲），
+    # 缺分片/缺会话直接以 FileNotFoundError 暴露，不再先逐个 stat 一轮
+    try:
+        out = open(merged_path, "wb")
+    except FileNotFoundError:
+        return jsonify({"err": "missing"}), 404
 
-    # 2. 合并
-    full_str = ""
     try:
-        for i in range(count):
-            with open(chunk_dir / str(i), "r", encoding="utf-8") as f:
-                full_str += f.read()
+        with out:
+            for i in range(count):
+                try:
+                    src = open(os.path.join(chunk_dir, str(i)), "rb")
+                except FileNotFoundError:
+                    clean_cache(sess_id)
+                    return jsonify({"err": f"missing_seq_{i}"}), 400
+                with src:
+                    shutil.copyfileobj(src, out, length=1 << 20)
+        if os.stat(merged_path).st_size == 0:
+            clean_cache(sess_id)
+            return jsonify({"err": "fmt_err"}), 400
     except Exception:
         clean_cache(sess_id)
         return jsonify({"err": "merge_err"}), 500
 
-    # 3. 解析并落盘
+    # 3. 解析并落库：mmap 让 orjson 直接从页缓存解析，省一次整段 memcpy
     try:
-        data_obj = json.loads(full_str)
+        with open(merged_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data_obj = orjson.loads(memoryview(mm))
 
-        # 生成最终文件
-        item_id = uuid.uuid4().hex
+        item_id = _uuid7_hex()
         ts = int(time.time())
 
         data_obj["srv_id"] = item_id  # server_id -> srv_id
         data_obj["ts"] = ts  # server_ts -> ts
 
-        filename = f"{ts}_{item_id}.json"
-        with open(DATA_DIR / filename, "w", encoding="utf-8") as f:
-            json.dump(data_obj, f, ensure_ascii=False, indent=0)
+        conn = _db()
+        conn.execute(
+            "INSERT INTO pastes(id, ts, mode, note, body) VALUES(?,?,?,?,?)",
+            (item_id, ts, data_obj.get("mode", 0), data_obj.get("note", ""),
+             zstd.compress(orjson.dumps(data_obj), 3)),
+        )
+        conn.commit()
 
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         clean_cache(sess_id)
         return jsonify({"err": "fmt_err"}), 400
     except Exception as e:
@@ -136,50 +294,67 @@ def io_commit():
 
 @app.route("/api/list", methods=["GET"])
 def get_list():
-    items = []
-    files = sorted(DATA_DIR.glob("*.json"), reverse=True)
+    # 单条走 ts 索引的 SELECT，不取 body 列（大段密文根本不离开 B-tree 页）
+    rows = _db().execute(
+        "SELECT id, ts, note, mode FROM pastes ORDER BY ts DESC, rowid DESC LIMIT 200"
+    ).fetchall()
+    items = [{"srv_id": r[0], "ts": r[1], "note": r[2], "mode": r[3]} for r in rows]
+    return Response(orjson.dumps(items), mimetype="application/json")
+
+
+@app.route("/api/get/<string:tid>", methods=["GET"])
+def get_item(tid):
+    """列表只含元数据，点击条目时按需拉取完整内容"""
+    if not _HEX32(tid):
+        return jsonify({"err": "bad_id"}), 400
 
-    for f in files[:200]:
-        try:
-            with open(f, "r", encoding="utf-8") as file:
-                data = json.load(file)
-                items.append(data)
-        except Exception:
-            continue
+    row = _db().execute("SELECT body FROM pastes WHERE id=?", (tid,)).fetchone()
+    if row is None:
+        return jsonify({"err": "404"}), 404
+
+    body = row[0]
+    if body[:4] == _ZSTD_MAGIC:
+        body = zstd.decompress(body)
 
-    return jsonify(items)
+    return Response(body, mimetype="application/json")
 
 
 @app.route("/api/del/<string:tid>", methods=["DELETE"])
 def del_item(tid):
-    if ".." in tid or "/" in tid:
+    if not _HEX32(tid):
         return jsonify({"err": "bad_id"}), 400
 
-    found_files = list(DATA_DIR.glob(f"*_{tid}.json"))
-    if not found_files:
-        return jsonify({"err": "404"}), 404
-
     try:
-        for file_path in found_files:
-            os.remove(file_path)
+        conn = _db()
+        cur = conn.execute("DELETE FROM pastes WHERE id=?", (tid,))
+        conn.commit()
     except Exception as e:
         return jsonify({"err": "sys_err"}), 500
 
+    if cur.rowcount == 0:
+        return jsonify({"err": "404"}), 404
+
     return jsonify({"ret": 0})
 
 
 # --- 静态资源 ---
+# 生产环境由 nginx sendfile 直出静态文件（见 deploy/nginx.conf），
+# Python 进程只处理 /api/；以下路由仅作开发环境兜底
+
+STATIC_DIR = Path(app.static_folder).resolve()
+
 
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_from_directory(STATIC_DIR, 'index.html')
 
 
 @app.route('/<path:path>')
 def serve_static(path):
-    if os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    else:
+    # send_from_directory 自带路径检查，无需先 os.path.exists 再 stat 一遍
+    try:
+        return send_from_directory(STATIC_DIR, path)
+    except NotFound:
         return abort(404)
 
 
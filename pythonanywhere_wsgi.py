@@ -5,29 +5,8 @@ project_home = '/home/SecurePaste/secure-paste'
 if project_home not in sys.path:
     sys.path.insert(0, project_home)
 
-# 2. 导入你的 FastAPI app
-from main import app as fastapi_app
-
-# 3. 关键修改：使用 a2wsgi 将 ASGI 转换为 WSGI
-from a2wsgi import ASGIMiddleware
-
-application = ASGIMiddleware(fastapi_app)
-
-
-
-
-
-
-
-
-"""
-import sys
-
-# 1. 设置项目路径
-project_home = '/home/SecurePaste/secure-paste'
-if project_home not in sys.path:
-    sys.path.insert(0, project_home)
-
-# 2. 导入你的 FastAPI app
+# 2. PythonAnywhere 只支持 WSGI：直接挂 Flask 版（原生 WSGI，无 async 路由）。
+#    之前用 a2wsgi 包 FastAPI，等于在阻塞的 WSGI worker 里跑事件循环，
+#    把 FastAPI 的异步并发优势全部丢掉。
+#    FastAPI 版 (main.py) 请用真正的 ASGI 服务器部署，见 Procfile。
 from main_flask import app as application
-"""
\ No newline at end of file